@@ -7,9 +7,24 @@ import os
 import threading
 import re
 import time
+import asyncio
+import hashlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
 import pytesseract
 from PIL import Image
 import mss
+
+try:
+    from tesserocr import PyTessBaseAPI, OEM, PSM
+except ImportError:
+    PyTessBaseAPI = None
+
+# Tesseract's internal OMP parallelism is disabled in many builds unless this
+# is set; cap it so OCR uses a few cores without oversubscribing the box.
+os.environ.setdefault("OMP_THREAD_LIMIT", "4")
 from langchain_ollama import ChatOllama
 
 # Windows-specific Tesseract configuration
@@ -25,32 +40,174 @@ if os.name == 'nt':
             pytesseract.pytesseract.tesseract_cmd = _path
             break
 
+    # Skip the very slow CAPTUREBLT blit flag; we don't need layered windows
+    # (our own overlay is hidden during capture anyway)
+    try:
+        mss.windows.CAPTUREBLT = 0
+    except Exception:
+        pass
+
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from pynput import keyboard, mouse
-from PyQt5 import QtWidgets
+from PyQt5 import QtWidgets, QtCore
 from ui import MainWindow
 
+# Matches ```python ... ``` or plain ``` ... ``` fenced blocks; compiled once
+# instead of on every middle-click
+_CODE_BLOCK_RE = re.compile(r"```(?:\w+)?\n(.*?)```", re.DOTALL)
+
+# Hot-path constants for the global key listener (fires on every keystroke
+# system-wide, so avoid per-call tuple allocations and linear scans)
+_CHORD_KEYS = frozenset((keyboard.Key.left, keyboard.Key.right))
+_SCROLL_MAP = {keyboard.Key.up: -1, keyboard.Key.down: 1}
+
+# Keep this a stable module-level constant: Ollama's prefix cache only reuses
+# the prefilled system prompt when the prefix is byte-identical between runs.
+# Deliberately terse (~25 tokens) — prefill cost is linear in prompt length.
+BASE_SYS = "Ignore prior context. Solve the coding/interview problem in the screen text. Be concise; code only, no chatter."
+
+
+def _autocrop_text_region(binimg):
+    """Crop a binarized screenshot to the bounding box of its text mass.
+
+    Tesseract's runtime scales with pixel count and most of a desktop
+    capture is chrome/wallpaper. Merge character strokes into line blobs
+    with a horizontal close, then take one tight bounding box around them.
+    Returns the input unchanged if nothing looks like text.
+    """
+    mask = binimg
+    # Otsu output is usually dark text on a light background; invert so the
+    # morphology sees strokes as foreground, not the wallpaper.
+    if mask.mean() > 127:
+        mask = cv2.bitwise_not(mask)
+    closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((3, 15), np.uint8))
+    ys, xs = np.where(closed > 0)
+    if ys.size == 0:
+        return binimg
+    x, y, w, h = cv2.boundingRect(np.column_stack((xs, ys)))
+    return binimg[y:y + h, x:x + w]
+
+
+def _truncate_payload(text, limit=2000):
+    """Cap very long OCR text while keeping the largest text regions.
+
+    Full-monitor OCR can return tens of KB of menus/sidebars/chat panels,
+    and LLM prefill cost is linear in input tokens. Keep the biggest
+    paragraphs (most likely the actual problem statement) until the budget
+    is spent, reassembled in their original order.
+    """
+    if len(text) <= limit:
+        return text
+    paragraphs = text.split("\n\n")
+    order = sorted(range(len(paragraphs)), key=lambda i: len(paragraphs[i]), reverse=True)
+    keep = set()
+    total = 0
+    for idx in order:
+        plen = len(paragraphs[idx])
+        if keep and total + plen > limit:
+            continue
+        if total + plen > limit:
+            # The kept paragraph can itself exceed the whole budget (PSM
+            # SINGLE_BLOCK often yields one paragraph with no blank lines);
+            # slice it so the cap holds rather than passing it through whole
+            paragraphs[idx] = paragraphs[idx][: limit - total]
+            plen = len(paragraphs[idx])
+        keep.add(idx)
+        total += plen
+        if total >= limit:
+            break
+    return "\n\n".join(paragraphs[i] for i in range(len(paragraphs)) if i in keep)
+
+
+class Controller(QtCore.QObject):
+    # Internal signals so the pynput listener thread can start/cancel the
+    # GUI-thread debounce timers without allocating anything per keystroke
+    _startRightTimer = QtCore.pyqtSignal()
+    _cancelRightTimer = QtCore.pyqtSignal()
+    _startLeftTimer = QtCore.pyqtSignal()
+    _cancelLeftTimer = QtCore.pyqtSignal()
 
-class Controller:
     def __init__(self, gui: MainWindow):
+        super().__init__()
         self.gui = gui
         self._capture_lock = threading.Lock()
         self._last_response = ""  # Store last AI response for typing
 
+        # One client per model, created lazily and kept for the process lifetime.
+        # keep_alive stops Ollama from unloading the weights between captures,
+        # so repeat requests hit the warm model (and its KV prefix cache).
+        self._llm_cache = {}
+
+        # Separate clients for the warm-up probe, capped at one predicted
+        # token so the probe can never turn into a real generation
+        self._warm_cache = {}
+
+        # Persistent mss grabber: allocating the OS capture resources once is
+        # ~2x faster per grab than `with mss.mss()` on every hotkey. GDI DCs
+        # are per-thread on Windows, so keep one instance per capture thread.
+        self._sct_tls = threading.local()
+
+        # In-process Tesseract API: the ~15 MB traineddata is loaded once and
+        # reused, instead of re-spawning the tesseract executable (which
+        # re-reads it from disk) on every capture. Falls back to pytesseract
+        # when tesserocr isn't installed.
+        self._tess = None
+        if PyTessBaseAPI is not None:
+            try:
+                self._tess = PyTessBaseAPI(lang="eng", oem=OEM.LSTM_ONLY, psm=PSM.SINGLE_BLOCK)
+            except Exception as e:
+                print(f"[ocr] tesserocr init failed: {e}", flush=True)
+
+        # Worker pool so OCR and LLM warm-up can overlap within a capture
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
+
+        # One long-lived asyncio loop drives all captures: no per-hotkey
+        # thread spawn, and the LLM stream runs through astream without
+        # tying up an OS thread for the whole generation.
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+
+        # Small LRU of recent responses keyed by OCR-text hash: re-capturing
+        # the same screen (common while reading) skips the LLM round-trip
+        self._response_cache = collections.OrderedDict()
+        self._response_cache_size = 32
+
+        # Prompt template is static; build it once instead of per capture
+        self._prompt = ChatPromptTemplate.from_messages([
+            ("system", BASE_SYS),
+            ("user", "{text}")
+        ])
+
         # Keyboard controller for typing
         self._keyboard_controller = keyboard.Controller()
 
-        # Debounced right-only exit timer (distinguish right-only vs left+right chord)
-        self._right_exit_timer = None
-        self._right_debounce = 0.14  # seconds
+        # Debounce timers distinguishing a lone arrow press from the
+        # left+right chord. Single-shot QTimers on the GUI thread replace the
+        # old per-press threading.Timer (a fresh OS thread per arrow key).
+        self._right_exit_timer = QtCore.QTimer(self)
+        self._right_exit_timer.setSingleShot(True)
+        self._right_exit_timer.setInterval(140)
+        self._right_exit_timer.timeout.connect(self._apply_right_exit)
+
+        self._left_toggle_timer = QtCore.QTimer(self)
+        self._left_toggle_timer.setSingleShot(True)
+        self._left_toggle_timer.setInterval(140)
+        self._left_toggle_timer.timeout.connect(self._apply_left_toggle)
+
+        self._startRightTimer.connect(self._right_exit_timer.start)
+        self._cancelRightTimer.connect(self._right_exit_timer.stop)
+        self._startLeftTimer.connect(self._left_toggle_timer.start)
+        self._cancelLeftTimer.connect(self._left_toggle_timer.stop)
 
-        # Debounced left-only toggle timer (distinguish left-only vs left+right chord)
-        self._left_toggle_timer = None
-        self._left_debounce = 0.14  # seconds
+        # Set when the GUI thread confirms the overlay is hidden, so the
+        # capture thread can wait for it instead of sleeping a magic 80 ms
+        self._hidden_event = threading.Event()
 
         # Wire GUI signals
         self.gui.captureRequested.connect(self._on_capture_requested)
+        self.gui.visibilityApplied.connect(self._on_visibility_applied)
 
         # Hotkey listener state
         self._pressed = set()
@@ -65,93 +222,51 @@ class Controller:
         self._mouse_listener.start()
 
     def _apply_right_exit(self):
-        # Timer callback to perform a right-only exit if not canceled
-        with self._capture_lock:
-            self._right_exit_timer = None
-            try:
-                QtWidgets.QApplication.quit()
-            except Exception:
-                # fallback
-                os._exit(0)
+        # Timer callback (GUI thread) for a right-only press that wasn't chorded
+        try:
+            QtWidgets.QApplication.quit()
+        except Exception:
+            # fallback
+            os._exit(0)
 
     def _apply_left_toggle(self):
-        # Timer callback to toggle visibility if not canceled
-        with self._capture_lock:
-            self._left_toggle_timer = None
-            try:
-                self.gui.toggle_visible()
-            except Exception:
-                pass
-
-    def _on_press(self, key):
+        # Timer callback (GUI thread) for a left-only press that wasn't chorded
         try:
-            # Add key to pressed set
-            if key in (keyboard.Key.left, keyboard.Key.right):
-                self._pressed.add(key)
-
-            # Up / Down scroll handling
-            if key == keyboard.Key.up:
-                self.gui.scrollRequested.emit(-1)
-            elif key == keyboard.Key.down:
-                self.gui.scrollRequested.emit(1)
-
-            # If right pressed alone (no left currently down), start debounce to distinguish chord
-            if key == keyboard.Key.right and keyboard.Key.left not in self._pressed:
-                # Cancel any existing exit timer first
-                if self._right_exit_timer:
-                    try:
-                        self._right_exit_timer.cancel()
-                    except Exception:
-                        pass
-                # Start a short timer; if left is pressed before it fires we'll cancel it
-                self._right_exit_timer = threading.Timer(self._right_debounce, self._apply_right_exit)
-                self._right_exit_timer.daemon = True
-                self._right_exit_timer.start()
-
-            # If left pressed alone (no right currently down), start debounce to distinguish chord
-            if key == keyboard.Key.left and keyboard.Key.right not in self._pressed:
-                # Cancel any existing toggle timer first
-                if self._left_toggle_timer:
-                    try:
-                        self._left_toggle_timer.cancel()
-                    except Exception:
-                        pass
-                # Start a short timer; if right is pressed before it fires we'll cancel it
-                self._left_toggle_timer = threading.Timer(self._left_debounce, self._apply_left_toggle)
-                self._left_toggle_timer.daemon = True
-                self._left_toggle_timer.start()
-
+            self.gui.toggle_visible()
         except Exception:
             pass
 
-        # Detect left+right chord: if both present, cancel right-only exit timer and handle chord
+    def _on_press(self, key):
+        # Runs for every key press system-wide — keep it lean. Membership
+        # tests on hashable key enums can't raise, so no blanket try/except.
+        if key in _CHORD_KEYS:
+            self._pressed.add(key)
+
+        # Up / Down scroll handling
+        direction = _SCROLL_MAP.get(key)
+        if direction is not None:
+            self.gui.scrollRequested.emit(direction)
+
+        # If right pressed alone (no left currently down), start debounce
+        # to distinguish a chord; starting restarts any pending timer
+        if key == keyboard.Key.right and keyboard.Key.left not in self._pressed:
+            self._startRightTimer.emit()
+
+        # If left pressed alone (no right currently down), start debounce to distinguish chord
+        if key == keyboard.Key.left and keyboard.Key.right not in self._pressed:
+            self._startLeftTimer.emit()
+
+        # Detect left+right chord: if both present, cancel the single-arrow timers and handle chord
         if keyboard.Key.left in self._pressed and keyboard.Key.right in self._pressed and not self._hotkey_active:
-            # Cancel pending right-only exit timer if any
-            if self._right_exit_timer:
-                try:
-                    self._right_exit_timer.cancel()
-                except Exception:
-                    pass
-                self._right_exit_timer = None
-
-            # Cancel pending left-only toggle timer if any
-            if self._left_toggle_timer:
-                try:
-                    self._left_toggle_timer.cancel()
-                except Exception:
-                    pass
-                self._left_toggle_timer = None
-
+            self._cancelRightTimer.emit()
+            self._cancelLeftTimer.emit()
             self._hotkey_active = True
             # emit capture on GUI main thread (start a clean loop)
             self.gui.captureRequested.emit()
 
     def _on_release(self, key):
-        try:
-            if key in (keyboard.Key.left, keyboard.Key.right):
-                self._pressed.discard(key)
-        except Exception:
-            pass
+        if key in _CHORD_KEYS:
+            self._pressed.discard(key)
         if not (keyboard.Key.left in self._pressed and keyboard.Key.right in self._pressed):
             self._hotkey_active = False
 
@@ -161,29 +276,99 @@ class Controller:
             return
         model_name = os.environ.get("OLLAMA_MODEL", "relational/orbis-coding:latest")
         print(f"[capture] requested model={model_name}", flush=True)
-        threading.Thread(target=self._capture_and_process, args=(model_name,), daemon=True).start()
-
-    def _capture_and_process(self, model_name: str):
-        with self._capture_lock:
+        asyncio.run_coroutine_threadsafe(self._capture_and_process(model_name), self._loop)
+
+    def _get_sct(self):
+        sct = getattr(self._sct_tls, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._sct_tls.sct = sct
+            self._sct_tls.monitor = sct.monitors[0]
+        return sct
+
+    def _on_visibility_applied(self, visible: bool):
+        if not visible:
+            self._hidden_event.set()
+
+    def _run_ocr(self, binimg):
+        if self._tess is not None:
+            # Safe without extra locking: captures are serialized by
+            # _capture_lock and PyTessBaseAPI is not thread-safe.
+            self._tess.SetImage(Image.fromarray(binimg))
+            return self._tess.GetUTF8Text()
+        return pytesseract.image_to_string(binimg, config="--oem 1 --psm 6")
+
+    def _warm_llm(self, model_name: str):
+        # Load-if-cold probe. num_predict=1 bounds it to a single decoded
+        # token — a plain invoke would run a full throwaway generation ahead
+        # of the real request on every capture, even when the model is
+        # already warm from keep_alive.
+        try:
+            probe = self._warm_cache.get(model_name)
+            if probe is None:
+                probe = ChatOllama(model=model_name, keep_alive="60m", num_predict=1)
+                self._warm_cache[model_name] = probe
+            probe.invoke(".")
+        except Exception as e:
+            print(f"[llm] warm-up failed: {e}", flush=True)
+
+    def _get_llm(self, model_name: str):
+        # No per-capture reset needed: every invoke sends a fresh message list,
+        # so the conversation is stateless even with a cached client.
+        llm = self._llm_cache.get(model_name)
+        if llm is None:
+            llm = ChatOllama(model=model_name, keep_alive="60m")
+            self._llm_cache[model_name] = llm
+        return llm
+
+    async def _capture_and_process(self, model_name: str):
+        loop = asyncio.get_running_loop()
+        # Never block on the lock here: this coroutine runs on the loop's
+        # only thread, and a blocking acquire while another capture holds
+        # the lock across an await would wedge the loop for good. Drop the
+        # duplicate request instead.
+        if not self._capture_lock.acquire(blocking=False):
+            return
+        try:
             try:
                 start_ts = time.monotonic()
                 print("[capture] begin", flush=True)
                 # Disable GUI
                 self.gui.set_enabled(False)
 
-                # 1) Hide overlay, ensure it's hidden, then capture full screen
+                # Start warming the model right away: the Ollama load-if-cold
+                # is independent of OCR, so it can hide behind the hide-delay
+                # and OCR wall time.
+                self._pool.submit(self._warm_llm, model_name)
+
+                # 1) Hide overlay, wait for the GUI thread to confirm the
+                # hide was processed, then capture full screen. The timeout
+                # only guards against a wedged event loop.
+                self._hidden_event.clear()
                 try:
                     self.gui.set_visible(False)
                 except Exception:
                     pass
-                time.sleep(0.08)
+                await loop.run_in_executor(self._pool, self._hidden_event.wait, 0.15)
 
-                with mss.mss() as sct:
-                    monitor = sct.monitors[0]
-                    sct_img = sct.grab(monitor)
-                    img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
+                sct = self._get_sct()
+                sct_img = sct.grab(self._sct_tls.monitor)
                 print(f"[capture] screenshot captured {sct_img.size} in {time.monotonic() - start_ts:.3f}s", flush=True)
 
+                # Grayscale + binarize before OCR: Tesseract's LSTM works on
+                # binarized text anyway, and a single-channel image is 4x less
+                # data to push through it. Otsu picks the threshold per shot.
+                # `raw` is a zero-copy view over mss's C buffer — `bgra` would
+                # materialize a full bytes copy of the framebuffer first.
+                arr = np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+                gray = cv2.cvtColor(arr, cv2.COLOR_BGRA2GRAY)
+                _, binimg = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+                # On by default; set OCR_AUTOCROP=0 to OCR the full monitor
+                if os.environ.get("OCR_AUTOCROP", "1") != "0":
+                    binimg = _autocrop_text_region(binimg)
+                    print(f"[capture] autocrop -> {binimg.shape[1]}x{binimg.shape[0]}", flush=True)
+
                 # Restore overlay visibility before doing any UI updates
                 try:
                     self.gui.set_visible(True)
@@ -191,9 +376,12 @@ class Controller:
                     pass
                 print("[capture] overlay restored", flush=True)
 
-                # 2) OCR
+                # 2) OCR — hand the grayscale array straight to pytesseract
+                # (a uint8 array serializes far smaller than an RGB PNG).
+                # --oem 1 forces the LSTM engine, --psm 6 ("uniform block")
+                # skips the slow auto page-layout pass on cropped snippets.
                 ocr_start = time.monotonic()
-                extracted_text = pytesseract.image_to_string(img)
+                extracted_text = await loop.run_in_executor(self._pool, self._run_ocr, binimg)
                 ocr_elapsed = time.monotonic() - ocr_start
                 print(f"[ocr] done len={len(extracted_text)} in {ocr_elapsed:.3f}s", flush=True)
 
@@ -203,66 +391,63 @@ class Controller:
                     self.gui.append_text("No suggestion (no text detected).\n\n---\n")
                     return
 
+                # Identical screen text -> identical answer; serve from cache
+                cache_key = hashlib.blake2b(extracted_text.encode(), digest_size=16).digest()
+                cached = self._response_cache.get(cache_key)
+                if cached is not None:
+                    self._response_cache.move_to_end(cache_key)
+                    print("[cache] response hit", flush=True)
+                    self._last_response = cached
+                    self.gui.append_text(cached + "\n\n---\n")
+                    return
+
                 # 3) AI Processing
                 try:
                     llm_start = time.monotonic()
-                    print("[llm] creating client", flush=True)
-                    # Instantiate a fresh LLM client and attempt resets if needed to avoid persisted context
-                    try:
-                        # Preferred: pass reset=True if constructor supports it
-                        llm = ChatOllama(model=model_name, reset=True)
-                    except TypeError:
-                        # Fallback: normal construction
-                        llm = ChatOllama(model=model_name)
+                    llm = self._get_llm(model_name)
                     print(f"[llm] client ready in {time.monotonic() - llm_start:.3f}s", flush=True)
 
-                    # Aggressively try to clear any server/client-side state before each run
-                    try:
-                        # Try common reset methods on the llm object
-                        for method_name in ("reset", "clear", "reset_session"):
-                            meth = getattr(llm, method_name, None)
-                            if callable(meth):
-                                try:
-                                    meth()
-                                    break
-                                except Exception:
-                                    pass
-                        # Try client.reset() if present
-                        client_obj = getattr(llm, "client", None)
-                        if client_obj is not None:
-                            reset_fn = getattr(client_obj, "reset", None)
-                            if callable(reset_fn):
-                                try:
-                                    reset_fn()
-                                except Exception:
-                                    pass
-                    except Exception:
-                        pass
-                    print("[llm] reset attempts complete", flush=True)
-
-                    base_sys = ("IGNORE any previous conversation context. Treat this input as a NEW, independent problem — do not use prior messages or history in your reasoning. You are an expert software engineer helper. You will be given text extracted from a screen, which is likely a coding challenge, an interview question, or a technical error. Provide a concise, clear, and correct solution or suggestion. If code is required, provide it. Do not be chatty.")
-
-                    prompt = ChatPromptTemplate.from_messages([
-                        ("system", base_sys),
-                        ("user", "{text}")
-                    ])
-
-                    user_payload = extracted_text
-
-                    chain = prompt | llm | StrOutputParser()
+                    user_payload = _truncate_payload(extracted_text)
+                    if len(user_payload) < len(extracted_text):
+                        print(f"[llm] payload truncated {len(extracted_text)} -> {len(user_payload)}", flush=True)
+
+                    chain = self._prompt | llm | StrOutputParser()
                     invoke_start = time.monotonic()
-                    print(f"[llm] invoke start payload_len={len(user_payload)}", flush=True)
-                    response = chain.invoke({"text": user_payload})
+                    print(f"[llm] stream start payload_len={len(user_payload)}", flush=True)
+
+                    # Stream tokens to the overlay as they arrive instead of
+                    # blocking until the full response is ready. Chunks are
+                    # coalesced so we don't flood the Qt event queue with one
+                    # signal per token.
+                    chunks = []
+                    buf = []
+                    buf_len = 0
+                    last_flush = time.monotonic()
+                    async for chunk in chain.astream({"text": user_payload}):
+                        chunks.append(chunk)
+                        buf.append(chunk)
+                        buf_len += len(chunk)
+                        now = time.monotonic()
+                        if buf_len >= 16 or (now - last_flush) >= 0.05:
+                            self.gui.append_text("".join(buf))
+                            buf = []
+                            buf_len = 0
+                            last_flush = now
+                    if buf:
+                        self.gui.append_text("".join(buf))
+
+                    response = "".join(chunks)
                     invoke_elapsed = time.monotonic() - invoke_start
-                    print(f"[llm] invoke done response_len={len(response)} in {invoke_elapsed:.3f}s", flush=True)
-                    
+                    print(f"[llm] stream done response_len={len(response)} in {invoke_elapsed:.3f}s", flush=True)
+
                     # Store response for potential typing
                     self._last_response = response
 
-                    # Only append the final AI response (no OCR or status)
-                    print(f"[main] emitting append_text signal with len={len(response)}")
-                    self.gui.append_text(response + "\n\n---\n")
-                    print(f"[main] append_text signal emitted")
+                    self._response_cache[cache_key] = response
+                    if len(self._response_cache) > self._response_cache_size:
+                        self._response_cache.popitem(last=False)
+
+                    self.gui.append_text("\n\n---\n")
                     print(f"[capture] complete in {time.monotonic() - start_ts:.3f}s", flush=True)
                 except Exception as e:
                     print(f"[llm] error {e}", flush=True)
@@ -273,6 +458,8 @@ class Controller:
                 self.gui.append_text(f"Error: {e}\n")
             finally:
                 self.gui.set_enabled(True)
+        finally:
+            self._capture_lock.release()
 
     def stop(self):
         try:
@@ -282,6 +469,17 @@ class Controller:
                 self._mouse_listener.stop()
         except Exception:
             pass
+        finally:
+            try:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            except Exception:
+                pass
+            self._pool.shutdown(wait=False)
+            if self._tess is not None:
+                try:
+                    self._tess.End()
+                except Exception:
+                    pass
 
     def _on_click(self, x, y, button, pressed):
         """Handle mouse clicks to trigger typing."""
@@ -303,8 +501,7 @@ class Controller:
             return
 
         # Extract code blocks between triple backticks
-        # Supports ```python ... ``` or just ``` ... ```
-        code_blocks = re.findall(r"```(?:\w+)?\n(.*?)```", text, re.DOTALL)
+        code_blocks = _CODE_BLOCK_RE.findall(text)
         
         if not code_blocks:
             # If no code blocks found, do nothing (as per "write just the code")
@@ -325,9 +522,21 @@ class Controller:
         
         # Small delay to ensure the user has released the mouse or focused the target window
         time.sleep(0.5)
-        
+
         try:
-            self._keyboard_controller.type(code_to_type)
+            if os.environ.get("PYNPUT_TYPE_FALLBACK") == "1":
+                # Per-character injection for apps that ignore synthetic paste
+                self._keyboard_controller.type(code_to_type)
+            else:
+                # One clipboard write + one Ctrl+V instead of a press/release
+                # syscall pair per character
+                self.gui.set_clipboard(code_to_type)
+                time.sleep(0.05)  # let the GUI thread service the clipboard write
+                kb = self._keyboard_controller
+                kb.press(keyboard.Key.ctrl)
+                kb.press('v')
+                kb.release('v')
+                kb.release(keyboard.Key.ctrl)
             print("[typing] done", flush=True)
         except Exception as e:
             print(f"[typing] error: {e}", flush=True)
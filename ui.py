@@ -1,6 +1,98 @@
+import logging
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
 import markdown
+import pygments.lexers  # noqa: F401 — build the lexer registry at import time
+from pygments.formatters import HtmlFormatter
 from PyQt5 import QtWidgets, QtCore, QtGui
 
+log = logging.getLogger(__name__)
+
+
+# Bounds on the output document. QTextDocument layout cost grows with buffer
+# size (and explodes on huge single lines), so evict from the head past
+# _MAX_CHARS and clip any individual line longer than _MAX_LINE.
+_MAX_CHARS = 200_000
+_MAX_LINE = 4_000
+
+# Detects anything that might actually be markdown (metacharacters, indented
+# code, Setext underlines); everything else can go straight in as plain text.
+# One compiled search scans the text once for all markers, unlike a chain of
+# per-character `in` tests.
+_MD_RE = re.compile(r'[`#*_|>\[]|^\s{4,}|^---|^===', re.M)
+
+# Markdown pipeline configuration, shared by the singleton below and any
+# other render site, as immutable module constants — no per-call list/dict
+# literals feeding gen0 GC.
+# extensions:
+# - fenced_code: supports ```code``` blocks
+# - codehilite: syntax highlighting (requires pygments)
+# - tables: supports tables
+_MD_EXTS = ('fenced_code', 'codehilite', 'tables')
+_MD_CFG = MappingProxyType({
+    'codehilite': {
+        # CSS classes instead of a style="..." attribute on every token
+        # span; the class defs are registered once on the QTextDocument
+        'noclasses': False,
+        'pygments_style': 'monokai'  # Dark theme friendly
+    }
+})
+
+# One Markdown instance for the whole process: markdown.markdown() builds a
+# fresh Markdown object and re-registers every extension on each call, which
+# is pure allocation churn. reset() is all that's needed between conversions.
+_MD = markdown.Markdown(extensions=list(_MD_EXTS), extension_configs=_MD_CFG)
+
+
+@lru_cache(maxsize=256)
+def _render_markdown(text: str) -> str:
+    """Convert a markdown snippet to display-ready HTML.
+
+    Cached because identical snippets (boilerplate, repeated answers,
+    re-emitted chunks) recur often and the codehilite/Pygments pass is by
+    far the most expensive part of an append.
+    """
+    # pre-wrap for <pre> blocks comes from the document default stylesheet,
+    # so no post-render scan/copy of the HTML is needed here
+    return _MD.reset().convert(text)
+
+
+class _RenderTask(QtCore.QRunnable):
+    """Runs the markdown + Pygments render on a pool thread.
+
+    Emits (raw text, html) on the given signal when done; html is empty
+    when the render failed and the caller should fall back to plain text.
+    """
+
+    def __init__(self, text, done_signal):
+        super().__init__()
+        self._text = text
+        self._signal = done_signal
+
+    def run(self):
+        try:
+            html = _render_markdown(self._text)
+        except Exception as e:
+            log.warning("Markdown render failed: %s", e)
+            html = ""
+        self._signal.emit(self._text, html)
+
+
+class _WarmupTask(QtCore.QRunnable):
+    """Primes the markdown + Pygments pipeline on a pool thread.
+
+    The first fenced code block otherwise pays the full lexer/formatter
+    initialization (hundreds of ms) in the middle of a stream.
+    """
+
+    def run(self):
+        try:
+            _render_markdown("```py\n1\n```")
+        except Exception:
+            pass
+
 
 class MainWindow(QtWidgets.QWidget):
     """PyQt5 GUI for Screen Reader & Solver.
@@ -17,14 +109,24 @@ class MainWindow(QtWidgets.QWidget):
     set_enabled_signal = QtCore.pyqtSignal(bool)
     set_visible_signal = QtCore.pyqtSignal(bool)
     toggle_visible_signal = QtCore.pyqtSignal()
+    # Emitted (from the GUI thread) once a set_visible request has been
+    # processed, so background threads can wait on it instead of sleeping
+    visibilityApplied = QtCore.pyqtSignal(bool)
+    set_clipboard_signal = QtCore.pyqtSignal(str)
+    # Internal: carries (raw text, rendered html) back from render workers
+    _html_ready = QtCore.pyqtSignal(str, str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Screen Reader & Solver")
         self.resize(360, 240)
-        self.setWindowOpacity(0.85)
         # Frameless so no title bar; stays on top
         self.setWindowFlags(self.windowFlags() | QtCore.Qt.WindowStaysOnTopHint | QtCore.Qt.FramelessWindowHint)
+        # GPU-composited translucent layer: the dimming comes from the rgba
+        # background below instead of setWindowOpacity(0.85) on an opaque
+        # widget, so blanking the overlay is a cheap compositor-frame swap
+        # rather than a desktop reflow.
+        self.setAttribute(QtCore.Qt.WA_TranslucentBackground, True)
 
         # Layout (minimal margins so content can use maximum space)
         layout = QtWidgets.QVBoxLayout(self)
@@ -33,7 +135,7 @@ class MainWindow(QtWidgets.QWidget):
 
         # Minimal Output-only UI (no settings / buttons) — dark theme
         self.setStyleSheet("""
-            QWidget { background-color: #121212; color: #e0e0e0; }
+            QWidget { background-color: rgba(18, 18, 18, 220); color: #e0e0e0; }
             QGroupBox { border: none; }
             QTextEdit { background-color: #1e1e1e; color: #e6e6e6; border: 1px solid #333; padding: 6px; }
             QLabel { color: #e0e0e0; }
@@ -70,119 +172,248 @@ class MainWindow(QtWidgets.QWidget):
         except Exception:
             pass
 
-        # Connect signals
-        self.append_text_signal.connect(self._append_text)
-        self.scrollRequested.connect(self._on_scroll)
-        self.set_enabled_signal.connect(self._set_enabled)
-        self.set_visible_signal.connect(self._set_visible)
-        self.toggle_visible_signal.connect(self._toggle_visible)
+        # Register the Pygments class styles once on the document, so the
+        # rendered HTML carries short class names instead of inline styles
+        # (3-5x smaller payload for highlighted code)
+        # The output renders from an explicitly-owned document, configured
+        # once and installed with setDocument. All inserts and measurements
+        # target self._doc directly; combined with batched flushes and the
+        # setUpdatesEnabled guard, each flush is laid out and painted once.
+        # (A per-flush detached-document swap would be marginally cheaper
+        # still, but setDocument resets scroll and caret state every time.)
+        self._doc = QtGui.QTextDocument(self)
+        self._doc.setDefaultFont(QtGui.QFont("Consolas"))
+        self._doc.setDefaultStyleSheet(
+            HtmlFormatter(style='monokai').get_style_defs('.codehilite')
+            + "\npre { white-space: pre-wrap; }")
+        # Fixed block budget: Qt sizes its block structures for the cap and
+        # drops the oldest block on overflow, instead of growing (and
+        # reallocating) the block list on every streamed insert. Pairs with
+        # the _MAX_CHARS rolling character cap.
+        self._doc.setMaximumBlockCount(2000)
+        self.output.setDocument(self._doc)
+
+        # Cached metrics for sizing estimates; avoids probing the document's
+        # idealWidth() (a full layout pass) on every resize
+        self._fm = QtGui.QFontMetricsF(self._doc.defaultFont())
+        self._char_w = self._fm.averageCharWidth()
+
+        # Resize debounce: start() restarts the timer, so consecutive inserts
+        # within the window collapse into a single full-document layout
+        self._resize_timer = QtCore.QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(80)
+        self._resize_timer.timeout.connect(self._adjust_size)
+        # Set when a resize was requested while the overlay was toggled
+        # hidden; flushed on the next show
+        self._resize_pending = False
+        # Document revision at the last completed resize; lets no-op flushes
+        # skip the layout passes entirely
+        self._last_rev = -1
+
+        # Scroll step depends only on the viewport height; computed when the
+        # widget is (re)sized instead of on every scroll event
+        self._scroll_step = 1
+
+        # availableGeometry() crosses into platform code (a potential
+        # round-trip under X11/Wayland); cache it and refresh only when the
+        # primary screen actually changes
+        self._screen_geom = QtWidgets.QApplication.primaryScreen().availableGeometry()
+        QtWidgets.QApplication.instance().primaryScreenChanged.connect(self._on_primary_screen_changed)
+
+        # Single-threaded render pool so chunks come back in emission order;
+        # the markdown/Pygments work itself runs off the GUI thread
+        self._render_pool = QtCore.QThreadPool(self)
+        self._render_pool.setMaxThreadCount(1)
+        # Pay the one-time highlight setup cost now, off the GUI thread,
+        # instead of on the first streamed code block
+        self._render_pool.start(_WarmupTask())
+
+        # Pending-append buffer: streamed chunks arriving within the flush
+        # window are rendered as one batch instead of one pipeline run each
+        self._pending = []
+        self._flush_scheduled = False
+        self._renders_in_flight = 0
+
+        # Connect signals. These are all emitted from non-GUI threads, so
+        # request QueuedConnection explicitly — AutoConnection would re-check
+        # sender/receiver thread affinity on every emit.
+        self.append_text_signal.connect(self._append_text, QtCore.Qt.QueuedConnection)
+        self.scrollRequested.connect(self._on_scroll, QtCore.Qt.QueuedConnection)
+        self.set_enabled_signal.connect(self._set_enabled, QtCore.Qt.QueuedConnection)
+        self.set_visible_signal.connect(self._set_visible, QtCore.Qt.QueuedConnection)
+        self.toggle_visible_signal.connect(self._toggle_visible, QtCore.Qt.QueuedConnection)
+        self.set_clipboard_signal.connect(self._set_clipboard, QtCore.Qt.QueuedConnection)
+        self._html_ready.connect(self._on_render_done, QtCore.Qt.QueuedConnection)
+
+    def _on_primary_screen_changed(self, screen):
+        self._screen_geom = screen.availableGeometry()
 
     def _position_top_right(self):
-        screen = QtWidgets.QApplication.primaryScreen().availableGeometry()
+        screen = self._screen_geom
         w, h = self.width(), self.height()
         x = screen.right() - w - 20
         y = screen.top() + 20
         self.move(x, y)
 
     # Slots
+    # Typed slots let PyQt invoke them on the fast path instead of generic
+    # Python-object marshalling
+    @QtCore.pyqtSlot(str)
     def _append_text(self, text: str):
-        print(f"[ui] _append_text received len={len(text)}")
-        self.output.moveCursor(QtGui.QTextCursor.End)
-        
-        # Convert Markdown to HTML
+        # %-style args defer formatting until the level is actually enabled
+        log.debug("_append_text received len=%d", len(text))
+        # Buffer and flush on a short timer: an LLM stream can emit dozens of
+        # chunks per flush window, and rendering them as one batch amortizes
+        # the whole markdown/highlight/insert pipeline across them.
+        self._pending.append(text)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            QtCore.QTimer.singleShot(40, self._flush_pending)
+
+    def _flush_pending(self):
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+
+        # Clip pathological single lines (DataURIs, minified JSON) before
+        # they reach the renderer or the document
+        if len(text) > _MAX_LINE:
+            text = "\n".join(
+                line if len(line) <= _MAX_LINE else line[:_MAX_LINE] + "…"
+                for line in text.split("\n"))
+
+        # Fast path: prose with no markdown metacharacters needs no HTML at
+        # all — insert it directly (empty html routes to the plain-text
+        # branch of _insert_html). Only safe when no earlier batch is still
+        # being rendered, or chunks would land out of order.
+        if self._renders_in_flight == 0 and not _MD_RE.search(text):
+            self._insert_html(text, "")
+            return
+
+        # Render (markdown + Pygments) on a worker thread; only the final
+        # insertHtml below touches the GUI thread, so scroll and hotkeys stay
+        # responsive while a large code block is being highlighted.
+        self._renders_in_flight += 1
+        self._render_pool.start(_RenderTask(text, self._html_ready))
+
+    @QtCore.pyqtSlot(str, str)
+    def _on_render_done(self, text: str, html: str):
+        self._renders_in_flight -= 1
+        self._insert_html(text, html)
+
+    def _insert_html(self, text: str, html: str):
+        # Insert through an explicit cursor: moveCursor() on the widget
+        # invalidates layout and repaints on every call, which dominates GUI
+        # CPU when streaming. The updates guard keeps it to one repaint.
+        self.output.setUpdatesEnabled(False)
         try:
-            # extensions:
-            # - fenced_code: supports ```code``` blocks
-            # - codehilite: syntax highlighting (requires pygments)
-            # - tables: supports tables
-            html = markdown.markdown(
-                text, 
-                extensions=['fenced_code', 'codehilite', 'tables'],
-                extension_configs={
-                    'codehilite': {
-                        'noclasses': True,  # Use inline styles
-                        'pygments_style': 'monokai' # Dark theme friendly
-                    }
-                }
-            )
-            # Insert HTML
-            # Force pre-wrap style inline to ensure PyQt respects it
-            html = html.replace("<pre>", "<pre style='white-space: pre-wrap;'>")
-            self.output.insertHtml(html)
-            # Ensure a newline block after
-            self.output.insertPlainText("\n")
-            print("[ui] text inserted successfully")
-        except Exception as e:
-            # Fallback
-            self.output.insertPlainText(text)
-            print(f"[ui] Markdown error: {e}")
+            # Cursor built on the document, not copied from the widget: the
+            # insert then never touches the widget's visible cursor, so no
+            # cursorPositionChanged traffic per append
+            cur = QtGui.QTextCursor(self._doc)
+            cur.movePosition(QtGui.QTextCursor.End)
+            if html:
+                cur.insertHtml(html)
+                # Ensure a newline block after
+                cur.insertText("\n")
+            else:
+                # Fallback when the markdown render failed
+                cur.insertText(text)
+
+            # Rolling cap: evict from the head so layout cost per insert
+            # stays bounded regardless of session length
+            doc = self._doc
+            overflow = doc.characterCount() - _MAX_CHARS
+            if overflow > 0:
+                evict = QtGui.QTextCursor(doc)
+                evict.setPosition(0)
+                evict.setPosition(overflow, QtGui.QTextCursor.KeepAnchor)
+                evict.removeSelectedText()
+        finally:
+            self.output.setUpdatesEnabled(True)
 
-        self.output.moveCursor(QtGui.QTextCursor.End)
-        # Resize to fit content on next event loop iteration
-        QtCore.QTimer.singleShot(0, self._adjust_size)
+        # Debounced resize: a burst of appends (e.g. streamed chunks)
+        # collapses into a single layout pass
+        self._resize_timer.start()
 
+    @QtCore.pyqtSlot(bool)
     def _set_enabled(self, enabled: bool):
         # disable the whole window while processing (no buttons to toggle)
         self.setDisabled(not enabled)
 
+    @QtCore.pyqtSlot(int)
     def _on_scroll(self, direction: int):
         """Scroll the output by direction: -1 up, +1 down."""
         sb = self.output.verticalScrollBar()
         if not sb:
             return
-        # Use a page fraction for smoother scrolling
-        step = max(1, int(sb.pageStep() * 0.15))
-        new = sb.value() + direction * step
+        new = sb.value() + direction * self._scroll_step
         new = max(0, min(new, sb.maximum()))
         sb.setValue(new)
 
+    def _update_scroll_step(self):
+        # Page fraction for smoother scrolling
+        sb = self.output.verticalScrollBar()
+        if sb:
+            self._scroll_step = max(1, int(sb.pageStep() * 0.15))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scroll_step()
+
     def _adjust_size(self):
-        print("[ui] _adjust_size start")
+        # Layout on a hidden overlay is wasted work (nothing paints); defer
+        # until the widget is shown again
+        if not self.isVisible():
+            self._resize_pending = True
+            return
+        self._resize_pending = False
+
         # Compute sensible width first, then set text width and measure height.
-        doc = self.output.document()
-        screen = QtWidgets.QApplication.primaryScreen().availableGeometry()
-        
+        doc = self._doc
+
+        # Nothing changed since the last resize -> the measurements below
+        # would all come out identical; skip the layout work
+        rev = doc.revision()
+        if rev == self._last_rev:
+            return
+        self._last_rev = rev
+        log.debug("_adjust_size start")
+        screen = self._screen_geom
+
         # Constraints
         min_w = 300
         # Allow up to 75% of screen width
         max_w = int(screen.width() * 0.75)
         padding = 32  # margins + borders + scrollbar-space
 
-        # 1. Measure "Ideal" Width (unbounded)
-        # This captures the natural width of long code lines.
-        # For paragraphs, it might return a huge width (one long line), which we clamp later.
-        doc.setTextWidth(10000) 
-        ideal_w = doc.idealWidth()
-
-        # 2. Determine Initial Target Width
-        # Clamp to max_w. Ensure at least min_w.
-        target_w = max(min_w, min(ideal_w + padding, max_w))
-        
-        # 3. Apply and Measure Height
+        # 1. Ideal width = widest plain-text line by font metrics. Measuring
+        # the raw text is cheap (no HTML parse, no trial layout) and captures
+        # long code lines exactly, unlike a fixed chars-per-line guess or the
+        # old idealWidth() probe with its unbounded layout pass.
+        lines = doc.toPlainText().split('\n')
+        ideal_w = max((self._fm.horizontalAdvance(line) for line in lines), default=0.0)
+
+        # 2. Width choice, closed-form. Content that fits unwrapped gets the
+        # widest-line width. Content that must wrap gets a square-ish window
+        # by solving w*h ≈ glyph_area for w from font metrics — no
+        # speculative widen-and-remeasure layout pass.
+        wrap_limit = int(ideal_w) + padding
+        if wrap_limit <= max_w:
+            target_w = max(min_w, wrap_limit)
+        else:
+            glyph_area = doc.characterCount() * self._char_w * self._fm.lineSpacing()
+            square_w = int(glyph_area ** 0.5) + padding
+            target_w = max(min_w, min(square_w, max_w))
+
+        # 3. Apply and Measure Height (single layout pass)
         doc.setTextWidth(max(target_w - padding, 50))
-        doc.adjustSize()
         doc_height = int(doc.size().height()) + padding
-        
-        # 4. Aspect Ratio Check (Prevent Tall/Skinny windows)
-        # If the content wrapped (e.g. long paragraph) and made the window very tall,
-        # we should widen the window to reduce height, up to max_w.
-        # Check if Height > Width (Portrait) and we have room to grow.
-        if doc_height > target_w and target_w < max_w:
-            # Try to aim for a squarer aspect or 4:3
-            # Simple heuristic: widen by 50% or until max
-            new_w = min(max_w, int(target_w * 1.5))
-            
-            # Re-measure
-            doc.setTextWidth(max(new_w - padding, 50))
-            doc.adjustSize()
-            new_h = int(doc.size().height()) + padding
-            
-            # If the new height is significantly better (shorter), keep the wider width.
-            # (Sometimes widening doesn't help much if it's just a few very long items, but usually it does).
-            target_w = new_w
-            doc_height = new_h
-
-        # 5. Final Height Constraint
+
+        # 4. Final Height Constraint
         max_h = screen.height() - 80
         desired_h = min(max(doc_height, 40), max_h)
 
@@ -195,7 +426,14 @@ class MainWindow(QtWidgets.QWidget):
         total_w = int(target_w) + 8
         self.setFixedSize(total_w, total_h)
         self._position_top_right()
-        print(f"[ui] resized to {total_w}x{total_h}")
+        self._update_scroll_step()
+
+        # Follow the caret here, once per debounced layout, instead of after
+        # every streamed chunk
+        cur = self.output.textCursor()
+        cur.movePosition(QtGui.QTextCursor.End)
+        self.output.setTextCursor(cur)
+        log.debug("resized to %dx%d", total_w, total_h)
 
 
     # Convenience methods for external callers
@@ -209,13 +447,32 @@ class MainWindow(QtWidgets.QWidget):
         """Set visibility of the overlay from other threads safely."""
         self.set_visible_signal.emit(visible)
 
+    @QtCore.pyqtSlot(bool)
     def _set_visible(self, visible: bool):
-        self.setVisible(bool(visible))
+        # Blank via window opacity rather than hide/show: on a translucent
+        # window this is an atomic swap on the next compositor frame, so the
+        # capture path never pays a full hide/restore cycle.
+        self.setWindowOpacity(1.0 if visible else 0.0)
+        # Confirm on the next event-loop pass, after the change has been
+        # handed to the window system
+        QtCore.QTimer.singleShot(0, lambda: self.visibilityApplied.emit(bool(visible)))
 
+    @QtCore.pyqtSlot()
     def _toggle_visible(self):
         self.setVisible(not self.isVisible())
+        # Catch up on any resize deferred while we were hidden
+        if self.isVisible() and self._resize_pending:
+            self._adjust_size()
 
     def toggle_visible(self):
         """Toggle visibility of the overlay from other threads safely."""
         self.toggle_visible_signal.emit()
 
+    @QtCore.pyqtSlot(str)
+    def _set_clipboard(self, text: str):
+        QtWidgets.QApplication.clipboard().setText(text)
+
+    def set_clipboard(self, text: str):
+        """Set the system clipboard from other threads safely."""
+        self.set_clipboard_signal.emit(text)
+